@@ -27,13 +27,20 @@ const checkMLHealth = async (req, res) => {
  */
 const detectAnomaly = async (req, res) => {
   try {
-    const loginData = req.body;
+    // Identity fields feed shared streaming counters in the ML service,
+    // so take them from the request itself rather than the body
+    const loginData = {
+      ...req.body,
+      userId: req.user._id.toString(),
+      ipAddress: req.ip || req.connection?.remoteAddress || 'unknown',
+      userAgent: req.headers['user-agent'] || 'unknown'
+    };
     
     // Validate required fields
-    if (!loginData.timestamp || !loginData.ipAddress || !loginData.userAgent) {
+    if (!loginData.timestamp) {
       return res.status(400).json({
         status: 'error',
-        message: 'Missing required fields: timestamp, ipAddress, userAgent'
+        message: 'Missing required field: timestamp'
       });
     }
     
@@ -168,10 +175,38 @@ const getMLStats = async (req, res) => {
   }
 };
 
+/**
+ * Get calibrated anomaly score distribution
+ * Pass ?challengeRate=0.05 to get the score threshold for that 2FA rate
+ */
+const getScoreDistribution = async (req, res) => {
+  try {
+    const response = await axios.get(`${ML_SERVICE_URL}/score-distribution`, {
+      params: req.query,
+      timeout: 5000
+    });
+    
+    res.json(response.data);
+  } catch (error) {
+    console.error('Failed to get score distribution:', error.message);
+    
+    if (error.response) {
+      return res.status(error.response.status).json(error.response.data);
+    }
+    
+    res.status(503).json({
+      status: 'error',
+      message: 'ML service unavailable',
+      details: error.message
+    });
+  }
+};
+
 module.exports = {
   checkMLHealth,
   detectAnomaly,
   analyzePassword,
   trainModels,
-  getMLStats
+  getMLStats,
+  getScoreDistribution
 };
@@ -65,6 +65,10 @@ def detect_anomaly():
         
         # Check if model is trained
         if not anomaly_detector.is_trained():
+            # Keep streaming counters warm until a model is available.
+            # Live counters bucket by receive time, so this doesn't read
+            # the (possibly missing or malformed) timestamp.
+            anomaly_detector.counters.record(data)
             return jsonify({
                 'isAnomaly': False,
                 'anomalyScore': 0,
@@ -158,6 +162,39 @@ def train_model():
             'error': str(e)
         }), 500
 
+@app.route('/score-distribution', methods=['GET'])
+def score_distribution():
+    """
+    Get the calibrated anomaly score distribution from training
+    Optional query: ?challengeRate=0.05 returns the anomalyScore threshold
+    that would send that fraction of logins to 2FA
+    """
+    try:
+        challenge_rate = request.args.get('challengeRate')
+
+        if challenge_rate is not None:
+            try:
+                challenge_rate = float(challenge_rate)
+            except ValueError:
+                return jsonify({'error': 'challengeRate must be a number between 0 and 1'}), 400
+
+            if not 0 <= challenge_rate <= 1:
+                return jsonify({'error': 'challengeRate must be between 0 and 1'}), 400
+
+        distribution = anomaly_detector.get_score_distribution(challenge_rate)
+
+        if distribution is None:
+            return jsonify({
+                'success': False,
+                'error': 'Score distribution not available',
+                'message': 'Train the model to build the score distribution.'
+            }), 404
+
+        return jsonify(distribution)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/stats', methods=['GET'])
 def get_stats():
     """Get ML service statistics"""
@@ -166,6 +203,7 @@ def get_stats():
             'modelTrained': anomaly_detector.is_trained(),
             'trainingDataSize': anomaly_detector.get_training_data_size(),
             'passwordAnalyzerReady': True,
+            'streamingCounters': anomaly_detector.counters.get_stats(),
             'version': '1.0.0'
         }
         return jsonify(stats)
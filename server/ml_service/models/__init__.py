@@ -4,5 +4,6 @@ Contains machine learning models for anomaly detection and password analysis
 """
 from .anomaly_detector import AnomalyDetector
 from .password_analyzer import PasswordAnalyzer
+from .streaming_counters import StreamingCounters
 
-__all__ = ['AnomalyDetector', 'PasswordAnalyzer']
+__all__ = ['AnomalyDetector', 'PasswordAnalyzer', 'StreamingCounters']
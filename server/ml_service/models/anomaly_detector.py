@@ -1,17 +1,69 @@
 import numpy as np
 import json
 import os
+import bisect
 from datetime import datetime
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+try:
+    from .streaming_counters import StreamingCounters
+except ImportError:
+    from models.streaming_counters import StreamingCounters
+
+
+def counter_settings_from_env(environ=os.environ):
+    """
+    Read streaming counter sizing from the environment.
+    ML_COUNTER_EXPECTED_EVENTS: per-window volumes, e.g. "1m=5000,1h=200000,24h=2000000"
+    ML_COUNTER_MAX_ERROR: tolerated overcount per key at those volumes
+    Returns: keyword arguments for StreamingCounters
+    """
+    settings = {}
+
+    expected = environ.get('ML_COUNTER_EXPECTED_EVENTS', '').strip()
+    if expected:
+        settings['expected_events'] = {}
+        for item in expected.split(','):
+            name, _, value = item.partition('=')
+            name = name.strip()
+            if name not in StreamingCounters.WINDOWS or not value.strip().isdigit() or int(value) <= 0:
+                raise ValueError(
+                    f"Invalid ML_COUNTER_EXPECTED_EVENTS entry '{item}'. "
+                    f"Use <window>=<events> with windows {', '.join(StreamingCounters.WINDOWS)}."
+                )
+            settings['expected_events'][name] = int(value)
+
+    max_error = environ.get('ML_COUNTER_MAX_ERROR', '').strip()
+    if max_error:
+        try:
+            settings['max_error'] = float(max_error)
+        except ValueError:
+            settings['max_error'] = 0
+        if not settings['max_error'] > 0:
+            raise ValueError(f"Invalid ML_COUNTER_MAX_ERROR '{max_error}'. Use a positive number.")
+
+    return settings
+
 class AnomalyDetector:
-    def __init__(self):
+    # Number of features produced by extract_features
+    NUM_FEATURES = 11
+    # Number of points in the raw score quantile table (0.5% steps)
+    NUM_QUANTILES = 201
+
+    def __init__(self, data_dir=None):
         self.model = None
         self.scaler = StandardScaler()
-        self.model_path = os.path.join(os.path.dirname(__file__), '../data/models/anomaly_model.pkl')
-        self.scaler_path = os.path.join(os.path.dirname(__file__), '../data/models/scaler.pkl')
+        # Live sliding-window counters fed by every scored login
+        self.counters = StreamingCounters(**counter_settings_from_env())
+        # Quantiles of raw training scores, used to calibrate score()
+        self.score_quantiles = None
+        self.data_dir = data_dir or os.path.join(os.path.dirname(__file__), '../data')
+        self.data_path = os.path.join(self.data_dir, 'login_logs.json')
+        self.model_path = os.path.join(self.data_dir, 'models/anomaly_model.pkl')
+        self.scaler_path = os.path.join(self.data_dir, 'models/scaler.pkl')
+        self.quantiles_path = os.path.join(self.data_dir, 'models/score_quantiles.pkl')
         
         # Load existing model if available
         self.load_model()
@@ -22,19 +74,21 @@ class AnomalyDetector:
     
     def get_training_data_size(self):
         """Get number of training samples"""
-        data_path = os.path.join(os.path.dirname(__file__), '../data/login_logs.json')
-        if os.path.exists(data_path):
-            with open(data_path, 'r') as f:
+        if os.path.exists(self.data_path):
+            with open(self.data_path, 'r') as f:
                 logs = json.load(f)
                 return len(logs)
         return 0
     
-    def extract_features(self, login_data):
+    def extract_features(self, login_data, counters=None):
         """
-        Extract numerical features from login data
+        Extract numerical features from login data.
+        The login is recorded in `counters` (the live counters by default)
+        so that windowed counts include it.
         Returns: numpy array of features
         """
         features = []
+        counts = (counters or self.counters).record(login_data)
         
         # 1. Hour of day (0-23)
         timestamp = datetime.fromisoformat(login_data['timestamp'].replace('Z', '+00:00'))
@@ -65,14 +119,26 @@ class AnomalyDetector:
             features.append(168)  # Default to 1 week
         
         # 7. Login frequency (logins in last 24 hours)
+        # Streaming counts cover callers that don't send historicalLogins
+        streamed_recent = counts['user']['24h'] - 1  # Exclude this login
         if 'historicalLogins' in login_data:
             recent_logins = [
                 l for l in login_data['historicalLogins']
                 if (timestamp - datetime.fromisoformat(l['timestamp'].replace('Z', '+00:00'))).days == 0
             ]
-            features.append(len(recent_logins))
+            features.append(max(len(recent_logins), streamed_recent))
         else:
-            features.append(0)
+            features.append(streamed_recent)
+        
+        # 8-9. Logins from this IP across all users (last minute / hour)
+        features.append(counts['ip']['1m'])
+        features.append(counts['ip']['1h'])
+        
+        # 10. Logins for this user in the last hour
+        features.append(counts['user']['1h'])
+        
+        # 11. Logins with this user agent in the last hour
+        features.append(counts['userAgent']['1h'])
         
         return np.array(features).reshape(1, -1)
     
@@ -81,25 +147,25 @@ class AnomalyDetector:
         Train the anomaly detection model using historical login data
         """
         # Load training data
-        data_path = os.path.join(os.path.dirname(__file__), '../data/login_logs.json')
-        
-        if not os.path.exists(data_path):
+        if not os.path.exists(self.data_path):
             raise FileNotFoundError("No training data found. Please collect login data first.")
         
-        with open(data_path, 'r') as f:
+        with open(self.data_path, 'r') as f:
             logs = json.load(f)
         
         if len(logs) < 50:
             raise ValueError(f"Insufficient training data. Need at least 50 login records, got {len(logs)}.")
         
         # Extract features from all logs
+        # Replay into fresh counters so the live ones aren't polluted
+        training_counters = StreamingCounters(use_event_time=True)
         X = []
         for i, log in enumerate(logs):
             # Build historical context for each login
             historical = logs[:i] if i > 0 else []
             log['historicalLogins'] = historical
             
-            features = self.extract_features(log)
+            features = self.extract_features(log, counters=training_counters)
             X.append(features[0])
         
         X = np.array(X)
@@ -115,6 +181,13 @@ class AnomalyDetector:
         )
         self.model.fit(X_scaled)
         
+        # Build quantile table of raw scores for calibration
+        raw_scores = self.model.score_samples(X_scaled)
+        self.score_quantiles = {
+            'rawScores': np.quantile(raw_scores, np.linspace(0, 1, self.NUM_QUANTILES)).tolist(),
+            'sampleSize': len(X)
+        }
+        
         # Save model
         self.save_model()
         
@@ -151,10 +224,66 @@ class AnomalyDetector:
         features_scaled = self.scaler.transform(features)
         # Isolation Forest returns negative scores, transform to 0-100
         raw_score = self.model.score_samples(features_scaled)[0]
-        # Normalize to 0-100 (more negative = more anomalous)
+        
+        if self.score_quantiles is not None:
+            return self.calibrate(raw_score)
+        
+        # Models trained before calibration: fixed normalization
+        # (more negative = more anomalous)
         normalized_score = max(0, min(100, (1 - (raw_score + 0.5)) * 100))
         return normalized_score
     
+    def calibrate(self, raw_score):
+        """
+        Map a raw score to the percentage of training logins that were
+        less anomalous (0-100, higher = more anomalous).
+        A score of 95 means 95% of training logins scored as more normal.
+        """
+        table = self.score_quantiles['rawScores']
+        last = len(table) - 1
+        
+        # Binary search in the sorted table, then interpolate between points
+        idx = bisect.bisect_left(table, raw_score)
+        if idx == 0:
+            cdf = 0.0
+        elif idx > last:
+            cdf = 1.0
+        else:
+            low, high = table[idx - 1], table[idx]
+            fraction = (raw_score - low) / (high - low) if high > low else 1.0
+            cdf = (idx - 1 + fraction) / last
+        
+        return (1 - cdf) * 100
+    
+    def get_score_distribution(self, challenge_rate=None):
+        """
+        Describe the calibrated score distribution of the training data.
+        If challenge_rate (0-1) is given, also return the anomalyScore
+        threshold that would challenge that fraction of logins.
+        """
+        if self.model is None or self.score_quantiles is None:
+            return None
+        
+        table = self.score_quantiles['rawScores']
+        last = len(table) - 1
+        distribution = {
+            'sampleSize': self.score_quantiles['sampleSize'],
+            'quantiles': [
+                {
+                    'percentile': round(i * 100 / last, 2),
+                    'rawScore': float(raw),
+                    'anomalyScore': round(100 - i * 100 / last, 2)
+                }
+                for i, raw in enumerate(table)
+            ]
+        }
+        
+        if challenge_rate is not None:
+            distribution['challengeRate'] = challenge_rate
+            distribution['threshold'] = (1 - challenge_rate) * 100
+        
+        return distribution
+    
     def get_anomaly_factors(self, features, login_data):
         """
         Explain which factors contributed to anomaly
@@ -180,6 +309,20 @@ class AnomalyDetector:
         if f[2] == 1 and 'endpoint' in login_data:
             factors.append('Weekend login activity')
         
+        # Bursts from a single IP across users
+        if f[7] > 10:
+            factors.append('Burst of logins from this IP in the last minute (possible credential stuffing)')
+        elif f[8] > 50:
+            factors.append('High login volume from this IP in the last hour')
+        
+        # Repeated logins for one account
+        if f[9] > 5:
+            factors.append('Repeated logins for this account in the last hour')
+        
+        # Shared browser user agents are common, so only flag large volumes
+        if f[10] > 100:
+            factors.append('High login volume from this user agent in the last hour (possible automated tooling)')
+        
         return factors if factors else ['No specific risk factors identified']
     
     def save_model(self):
@@ -187,15 +330,26 @@ class AnomalyDetector:
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
         joblib.dump(self.model, self.model_path)
         joblib.dump(self.scaler, self.scaler_path)
+        joblib.dump(self.score_quantiles, self.quantiles_path)
         print(f"Model saved to {self.model_path}")
     
     def load_model(self):
         """Load trained model from disk"""
         try:
             if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
-                self.model = joblib.load(self.model_path)
-                self.scaler = joblib.load(self.scaler_path)
+                model = joblib.load(self.model_path)
+                scaler = joblib.load(self.scaler_path)
+                if getattr(scaler, 'n_features_in_', self.NUM_FEATURES) != self.NUM_FEATURES:
+                    print("Saved model uses an older feature set. Please retrain.")
+                    return
+                self.model = model
+                self.scaler = scaler
+                if os.path.exists(self.quantiles_path):
+                    self.score_quantiles = joblib.load(self.quantiles_path)
+                else:
+                    print("No score quantiles found. Retrain to calibrate scores.")
                 print("Model loaded successfully")
         except Exception as e:
             print(f"Could not load model: {e}")
             self.model = None
+            self.score_quantiles = None
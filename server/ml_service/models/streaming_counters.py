@@ -0,0 +1,223 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+class SlidingWindowSketch:
+    """
+    Time-bucketed count-min sketch over a single sliding window.
+
+    The window is split into a ring of buckets, each holding its own
+    count-min sketch. Memory is fixed at buckets * depth * width counters
+    regardless of how many distinct keys are seen, and both add() and
+    estimate() touch a constant number of cells.
+
+    Estimates never undercount. With probability 1 - e^-depth they
+    overcount by at most e * N / width, where N is the number of events
+    in the window. Conservative update usually keeps the error well
+    below that bound.
+    """
+
+    def __init__(self, window_seconds, num_buckets, width=2048, depth=4):
+        self.window_seconds = window_seconds
+        self.num_buckets = num_buckets
+        self.bucket_seconds = window_seconds / num_buckets
+        self.width = width
+        self.depth = depth
+
+        self.counts = np.zeros((num_buckets, depth, width), dtype=np.uint32)
+        # Absolute bucket index currently stored in each ring slot (-1 = empty)
+        self.epochs = np.full(num_buckets, -1, dtype=np.int64)
+        # Total events per slot, used to report the error bound
+        self.totals = np.zeros(num_buckets, dtype=np.int64)
+        self._rows = np.arange(depth)
+
+    def _bucket_index(self, ts):
+        return int(ts // self.bucket_seconds)
+
+    def add(self, columns, ts, count=1):
+        """Record an event for the key hashed to `columns` at time `ts` (seconds)"""
+        index = self._bucket_index(ts)
+        slot = index % self.num_buckets
+
+        if index < self.epochs[slot]:
+            # The slot already holds a newer bucket, so this event has
+            # fallen out of the window
+            return
+        if index > self.epochs[slot]:
+            self.counts[slot].fill(0)
+            self.totals[slot] = 0
+            self.epochs[slot] = index
+
+        # Conservative update: only raise cells up to the new estimate
+        cells = self.counts[slot, self._rows, columns]
+        self.counts[slot, self._rows, columns] = np.maximum(cells, cells.min() + count)
+        self.totals[slot] += count
+
+    def estimate(self, columns, ts):
+        """Estimated number of events for the key within the window ending at `ts`"""
+        index = self._bucket_index(ts)
+        live = (self.epochs > index - self.num_buckets) & (self.epochs <= index)
+        if not live.any():
+            return 0
+
+        # Gather the key's cells before masking so only buckets * depth
+        # counters are copied, independent of width
+        per_row = self.counts[:, self._rows, columns][live].sum(axis=0)
+        return int(per_row.min())
+
+    def error_bound(self):
+        """Overcount bound (e * N / width) for the most recent window"""
+        head = self.epochs.max()
+        if head < 0:
+            return 0.0
+        live = self.epochs > head - self.num_buckets
+        return math.e * int(self.totals[live].sum()) / self.width
+
+    def memory_bytes(self):
+        return int(self.counts.nbytes + self.epochs.nbytes + self.totals.nbytes)
+
+
+class StreamingCounters:
+    """
+    In-process login event counters keyed by IP, user and user agent.
+
+    Each dimension keeps a count-min sketch per sliding window (1 minute,
+    1 hour, 24 hours), so burst detection stays O(1) per event even with
+    millions of distinct keys. Counts can over-estimate on hash collisions
+    but never under-estimate.
+
+    By default events are bucketed by the service's monotonic clock at
+    receive time, so neither a caller-supplied timestamp nor a wall-clock
+    step can pin or skip ring slots. Set use_event_time=True only for
+    trusted, chronological replays such as training on the login log.
+    """
+
+    # name -> (window length in seconds, number of ring buckets)
+    WINDOWS = {
+        '1m': (60, 6),
+        '1h': (3600, 12),
+        '24h': (86400, 12),
+    }
+
+    # Events per window the default sizing is built for, and the overcount
+    # tolerated at that volume. Width is e * expected / max_error, so
+    # raise expected_events for busier deployments.
+    EXPECTED_EVENTS = {
+        '1m': 1000,
+        '1h': 10000,
+        '24h': 50000,
+    }
+    MAX_ERROR = 2
+
+    DIMENSIONS = {
+        'ip': 'ipAddress',
+        'user': 'userId',
+        'userAgent': 'userAgent',
+    }
+
+    def __init__(self, expected_events=None, max_error=None, depth=4, use_event_time=False):
+        self.expected_events = {**self.EXPECTED_EVENTS, **(expected_events or {})}
+        self.max_error = max_error or self.MAX_ERROR
+        self.depth = depth
+        self.widths = {
+            name: math.ceil(math.e * self.expected_events[name] / self.max_error)
+            for name in self.WINDOWS
+        }
+        self.sketches = {
+            dimension: {
+                name: SlidingWindowSketch(seconds, buckets, self.widths[name], depth)
+                for name, (seconds, buckets) in self.WINDOWS.items()
+            }
+            for dimension in self.DIMENSIONS
+        }
+        self.use_event_time = use_event_time
+        self.events_seen = 0
+        self._lock = threading.Lock()
+
+    def _columns(self, dimension, key):
+        """Map a key to one column per sketch row using double hashing"""
+        digest = hashlib.blake2b(
+            f'{dimension}:{key}'.encode('utf-8'), digest_size=8
+        ).digest()
+        h1 = int.from_bytes(digest[:4], 'little')
+        h2 = int.from_bytes(digest[4:], 'little') | 1
+        # Column offsets, reduced modulo each window's width when used
+        return np.array([h1 + i * h2 for i in range(self.depth)], dtype=np.int64)
+
+    def _timestamp(self, login_data):
+        if not self.use_event_time:
+            return time.monotonic()
+        timestamp = datetime.fromisoformat(login_data['timestamp'].replace('Z', '+00:00'))
+        return timestamp.timestamp()
+
+    def _keys(self, login_data):
+        return {
+            dimension: self._columns(dimension, login_data.get(field) or 'unknown')
+            for dimension, field in self.DIMENSIONS.items()
+        }
+
+    def record(self, login_data):
+        """
+        Count a login event and return the updated window counts.
+        Counts include the event being recorded.
+        """
+        keys = self._keys(login_data)
+
+        with self._lock:
+            ts = self._timestamp(login_data)
+            for dimension, columns in keys.items():
+                for sketch in self.sketches[dimension].values():
+                    sketch.add(columns % sketch.width, ts)
+            self.events_seen += 1
+            return self._estimate_all(keys, ts)
+
+    def query(self, login_data):
+        """Return window counts for the event's keys without recording it"""
+        keys = self._keys(login_data)
+
+        with self._lock:
+            ts = self._timestamp(login_data)
+            return self._estimate_all(keys, ts)
+
+    def _estimate_all(self, keys, ts):
+        return {
+            dimension: {
+                name: sketch.estimate(columns % sketch.width, ts)
+                for name, sketch in self.sketches[dimension].items()
+            }
+            for dimension, columns in keys.items()
+        }
+
+    def get_stats(self):
+        """Get counter configuration, accuracy and memory footprint"""
+        memory = sum(
+            sketch.memory_bytes()
+            for windows in self.sketches.values()
+            for sketch in windows.values()
+        )
+        with self._lock:
+            windows = {
+                name: {
+                    'sketchWidth': self.widths[name],
+                    'expectedEvents': self.expected_events[name],
+                    # Current worst-case overcount per dimension
+                    'errorBound': {
+                        dimension: round(self.sketches[dimension][name].error_bound(), 2)
+                        for dimension in self.DIMENSIONS
+                    }
+                }
+                for name in self.WINDOWS
+            }
+        return {
+            'eventsSeen': self.events_seen,
+            'dimensions': list(self.DIMENSIONS),
+            'windows': windows,
+            'maxError': self.max_error,
+            'sketchDepth': self.depth,
+            'memoryBytes': memory
+        }
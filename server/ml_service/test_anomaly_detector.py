@@ -0,0 +1,136 @@
+"""
+Tests for the anomaly detector's streaming-counter features
+Run with: python -m pytest test_anomaly_detector.py
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.anomaly_detector import AnomalyDetector, counter_settings_from_env
+
+BASE = datetime(2025, 1, 15, 10, 30, tzinfo=timezone.utc)
+
+
+def login(hours=0, user='user1', ip='10.0.0.1'):
+    timestamp = (BASE + timedelta(hours=hours)).isoformat().replace('+00:00', 'Z')
+    return {
+        'userId': user,
+        'timestamp': timestamp,
+        'ipAddress': ip,
+        'userAgent': 'Mozilla/5.0',
+        'endpoint': '/api/auth/login'
+    }
+
+
+def write_logs(data_dir, count=60):
+    logs = [login(i * 3, user=f'user{i % 4}', ip=f'10.0.0.{i % 4}') for i in range(count)]
+    with open(os.path.join(data_dir, 'login_logs.json'), 'w') as f:
+        json.dump(logs, f)
+
+
+def neutral_features(**overrides):
+    # Midday weekday login, a day after the last one, no recent activity
+    features = [12, 2, 0, 0.5, 0.5, 24, 0, 1, 1, 1, 1]
+    for index, value in overrides.items():
+        features[int(index[1:])] = value
+    return np.array(features, dtype=float).reshape(1, -1)
+
+
+def test_extract_features_returns_all_features(tmp_path):
+    detector = AnomalyDetector(data_dir=str(tmp_path))
+    features = detector.extract_features(login())
+
+    assert features.shape == (1, AnomalyDetector.NUM_FEATURES)
+    assert AnomalyDetector.NUM_FEATURES == 11
+
+
+def test_login_frequency_uses_streamed_count_without_history(tmp_path):
+    detector = AnomalyDetector(data_dir=str(tmp_path))
+
+    first = detector.extract_features(login())
+    second = detector.extract_features(login())
+
+    # Feature 7 excludes the login being scored
+    assert first[0][6] == 0
+    assert second[0][6] == 1
+
+
+def test_login_frequency_prefers_larger_historical_count(tmp_path):
+    detector = AnomalyDetector(data_dir=str(tmp_path))
+    data = {**login(), 'historicalLogins': [login(-h) for h in (1, 2, 3)]}
+
+    assert detector.extract_features(data)[0][6] == 3
+
+
+def test_train_replays_into_its_own_counters(tmp_path):
+    write_logs(tmp_path)
+    detector = AnomalyDetector(data_dir=str(tmp_path))
+
+    result = detector.train()
+
+    assert result['totalSamples'] == 60
+    assert detector.counters.events_seen == 0
+
+
+def test_load_model_ignores_older_feature_set(tmp_path):
+    X = np.random.default_rng(0).normal(size=(60, 7))
+    scaler = StandardScaler().fit(X)
+    model = IsolationForest(random_state=42).fit(scaler.transform(X))
+    os.makedirs(tmp_path / 'models')
+    joblib.dump(model, tmp_path / 'models' / 'anomaly_model.pkl')
+    joblib.dump(scaler, tmp_path / 'models' / 'scaler.pkl')
+
+    detector = AnomalyDetector(data_dir=str(tmp_path))
+
+    assert not detector.is_trained()
+
+
+@pytest.mark.parametrize('feature, below, at, factor', [
+    ('f7', 10, 11, 'Burst of logins from this IP in the last minute (possible credential stuffing)'),
+    ('f8', 50, 51, 'High login volume from this IP in the last hour'),
+    ('f9', 5, 6, 'Repeated logins for this account in the last hour'),
+    ('f10', 100, 101, 'High login volume from this user agent in the last hour (possible automated tooling)'),
+])
+def test_burst_factors_fire_above_threshold(tmp_path, feature, below, at, factor):
+    detector = AnomalyDetector(data_dir=str(tmp_path))
+
+    assert factor not in detector.get_anomaly_factors(neutral_features(**{feature: below}), login())
+    assert factor in detector.get_anomaly_factors(neutral_features(**{feature: at}), login())
+
+
+def test_ip_minute_burst_replaces_hourly_volume_factor(tmp_path):
+    detector = AnomalyDetector(data_dir=str(tmp_path))
+    factors = detector.get_anomaly_factors(neutral_features(f7=11, f8=51), login())
+
+    assert 'Burst of logins from this IP in the last minute (possible credential stuffing)' in factors
+    assert 'High login volume from this IP in the last hour' not in factors
+
+
+def test_counter_settings_from_env():
+    settings = counter_settings_from_env({
+        'ML_COUNTER_EXPECTED_EVENTS': '1m=5000, 1h=200000',
+        'ML_COUNTER_MAX_ERROR': '3'
+    })
+
+    assert settings == {'expected_events': {'1m': 5000, '1h': 200000}, 'max_error': 3.0}
+    assert counter_settings_from_env({}) == {}
+
+
+@pytest.mark.parametrize('environ', [
+    {'ML_COUNTER_EXPECTED_EVENTS': '2m=5000'},
+    {'ML_COUNTER_EXPECTED_EVENTS': '1h=lots'},
+    {'ML_COUNTER_MAX_ERROR': '0'},
+    {'ML_COUNTER_MAX_ERROR': 'abc'},
+])
+def test_counter_settings_reject_bad_values(environ):
+    with pytest.raises(ValueError):
+        counter_settings_from_env(environ)
@@ -0,0 +1,174 @@
+"""
+Tests for percentile-calibrated anomaly scores
+Run with: python -m pytest test_score_calibration.py
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as ml_app
+from models.anomaly_detector import AnomalyDetector
+
+BASE = datetime(2025, 1, 15, 10, 30, tzinfo=timezone.utc)
+
+
+def make_detector(table, sample_size=1000):
+    # Skip __init__ so no model is loaded from disk
+    detector = AnomalyDetector.__new__(AnomalyDetector)
+    detector.model = object()
+    detector.score_quantiles = {'rawScores': list(table), 'sampleSize': sample_size}
+    return detector
+
+
+def trained_detector(data_dir, count=80):
+    logs = []
+    for i in range(count):
+        timestamp = (BASE + timedelta(hours=i * 5)).isoformat().replace('+00:00', 'Z')
+        logs.append({
+            'userId': f'user{i % 4}',
+            'timestamp': timestamp,
+            'ipAddress': f'10.0.0.{i % 4}',
+            'userAgent': 'Mozilla/5.0',
+            'endpoint': '/api/auth/login'
+        })
+    with open(os.path.join(data_dir, 'login_logs.json'), 'w') as f:
+        json.dump(logs, f)
+
+    detector = AnomalyDetector(data_dir=str(data_dir))
+    detector.train()
+    return detector, logs
+
+
+def raw_score(detector, features):
+    return detector.model.score_samples(detector.scaler.transform(features))[0]
+
+
+def training_detector(seed=7, size=5000):
+    raw_scores = np.random.default_rng(seed).normal(-0.45, 0.05, size)
+    table = np.quantile(raw_scores, np.linspace(0, 1, AnomalyDetector.NUM_QUANTILES))
+    return make_detector(table, size), raw_scores
+
+
+def test_scores_are_monotonic():
+    detector, raw_scores = training_detector()
+    scores = [detector.calibrate(raw) for raw in np.sort(raw_scores)]
+
+    assert all(a >= b for a, b in zip(scores, scores[1:]))
+
+
+def test_scores_at_or_below_lowest_quantile_are_100():
+    detector = make_detector([-0.8, -0.5, -0.3])
+
+    assert detector.calibrate(-0.8) == 100
+    assert detector.calibrate(-2.0) == 100
+
+
+def test_scores_above_highest_quantile_are_0():
+    detector = make_detector([-0.8, -0.5, -0.3])
+
+    assert detector.calibrate(-0.1) == 0
+    assert detector.calibrate(-0.3) == 0
+
+
+def test_scores_interpolate_between_quantiles():
+    detector = make_detector([0.0, 1.0, 2.0])
+
+    assert detector.calibrate(0.5) == pytest.approx(75)
+    assert detector.calibrate(1.0) == pytest.approx(50)
+    assert detector.calibrate(1.5) == pytest.approx(25)
+
+
+def test_threshold_matches_challenge_rate():
+    detector, raw_scores = training_detector()
+    scores = np.array([detector.calibrate(raw) for raw in raw_scores])
+
+    for rate in [0.01, 0.05, 0.1, 0.25]:
+        distribution = detector.get_score_distribution(rate)
+        assert distribution['threshold'] == pytest.approx((1 - rate) * 100)
+        assert np.mean(scores > distribution['threshold']) == pytest.approx(rate, abs=0.005)
+
+
+def test_distribution_lists_every_quantile():
+    detector, _ = training_detector()
+    distribution = detector.get_score_distribution()
+
+    quantiles = distribution['quantiles']
+    assert len(quantiles) == AnomalyDetector.NUM_QUANTILES
+    assert quantiles[0]['anomalyScore'] == 100
+    assert quantiles[-1]['anomalyScore'] == 0
+    assert 'threshold' not in distribution
+
+
+def test_distribution_unavailable_without_quantiles():
+    detector = make_detector([0.0, 1.0])
+    detector.score_quantiles = None
+
+    assert detector.get_score_distribution(0.05) is None
+
+
+def test_quantiles_round_trip_through_disk(tmp_path):
+    trained, logs = trained_detector(tmp_path)
+    assert os.path.exists(trained.quantiles_path)
+
+    loaded = AnomalyDetector(data_dir=str(tmp_path))
+    assert loaded.score_quantiles == trained.score_quantiles
+    assert loaded.score_quantiles['sampleSize'] == len(logs)
+
+    features = loaded.extract_features(logs[-1])
+    assert loaded.score(features) == pytest.approx(loaded.calibrate(raw_score(loaded, features)))
+
+
+def test_score_falls_back_without_quantiles_file(tmp_path):
+    trained, logs = trained_detector(tmp_path)
+    os.remove(trained.quantiles_path)
+
+    loaded = AnomalyDetector(data_dir=str(tmp_path))
+    assert loaded.is_trained()
+    assert loaded.score_quantiles is None
+    assert loaded.get_score_distribution(0.05) is None
+
+    features = loaded.extract_features(logs[-1])
+    expected = max(0, min(100, (1 - (raw_score(loaded, features) + 0.5)) * 100))
+    assert loaded.score(features) == pytest.approx(expected)
+
+
+def test_score_distribution_endpoint_before_training(tmp_path, monkeypatch):
+    monkeypatch.setattr(ml_app, 'anomaly_detector', AnomalyDetector(data_dir=str(tmp_path)))
+    response = ml_app.app.test_client().get('/score-distribution?challengeRate=0.05')
+
+    assert response.status_code == 404
+    assert response.get_json()['error'] == 'Score distribution not available'
+
+
+def test_score_distribution_endpoint_after_training(tmp_path, monkeypatch):
+    detector, logs = trained_detector(tmp_path)
+    monkeypatch.setattr(ml_app, 'anomaly_detector', detector)
+    client = ml_app.app.test_client()
+
+    response = client.get('/score-distribution?challengeRate=0.05')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['threshold'] == pytest.approx(95)
+    assert body['challengeRate'] == 0.05
+    assert body['sampleSize'] == len(logs)
+    assert len(body['quantiles']) == AnomalyDetector.NUM_QUANTILES
+
+    response = client.get('/score-distribution')
+    assert response.status_code == 200
+    assert 'threshold' not in response.get_json()
+
+
+@pytest.mark.parametrize('rate', ['5%', 'abc', 'nan', '', '-0.1', '1.5'])
+def test_score_distribution_endpoint_rejects_bad_rate(tmp_path, monkeypatch, rate):
+    detector, _ = trained_detector(tmp_path)
+    monkeypatch.setattr(ml_app, 'anomaly_detector', detector)
+    response = ml_app.app.test_client().get(f'/score-distribution?challengeRate={rate}')
+
+    assert response.status_code == 400
+    assert 'challengeRate' in response.get_json()['error']
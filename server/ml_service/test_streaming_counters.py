@@ -0,0 +1,116 @@
+"""
+Tests for the sliding-window sketch counters
+Run with: python -m pytest test_streaming_counters.py
+"""
+import os
+import random
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.streaming_counters import SlidingWindowSketch, StreamingCounters
+
+BASE = datetime(2025, 1, 15, 10, 30, tzinfo=timezone.utc)
+
+
+def login(seconds=0, ip='10.0.0.1', user='user1', agent='Mozilla/5.0'):
+    timestamp = (BASE + timedelta(seconds=seconds)).isoformat().replace('+00:00', 'Z')
+    return {'timestamp': timestamp, 'ipAddress': ip, 'userId': user, 'userAgent': agent}
+
+
+def test_counts_expire_with_their_window():
+    counters = StreamingCounters(use_event_time=True)
+    counters.record(login(0))
+
+    assert counters.query(login(30))['ip'] == {'1m': 1, '1h': 1, '24h': 1}
+    assert counters.query(login(61))['ip'] == {'1m': 0, '1h': 1, '24h': 1}
+    assert counters.query(login(3601))['ip'] == {'1m': 0, '1h': 0, '24h': 1}
+    assert counters.query(login(86401))['ip'] == {'1m': 0, '1h': 0, '24h': 0}
+
+
+def test_out_of_order_events_within_window_are_counted():
+    counters = StreamingCounters(use_event_time=True)
+    for seconds in [40, 5, 25, 0, 55]:
+        counters.record(login(seconds))
+
+    assert counters.query(login(55))['ip']['1m'] == 5
+
+
+def test_late_event_does_not_clear_newer_bucket():
+    # t=40s maps to the same ring slot as t=100s but is a full window older
+    counters = StreamingCounters(use_event_time=True)
+    counters.record(login(100))
+    counters.record(login(40))
+
+    assert counters.query(login(100))['ip']['1m'] == 1
+
+
+def test_sketch_drops_event_older_than_its_slot():
+    sketch = SlidingWindowSketch(60, 6, width=16, depth=2)
+    columns = np.array([3, 7])
+
+    sketch.add(columns, 100.0)
+    sketch.add(columns, 40.0)
+
+    assert sketch.estimate(columns, 100.0) == 1
+    assert sketch.estimate(columns, 40.0) == 0
+
+
+def test_far_future_request_timestamp_does_not_pin_live_slots():
+    counters = StreamingCounters()
+    counters.record({**login(), 'timestamp': '2099-01-01T00:00:00Z'})
+    for i in range(60):
+        counts = counters.record(login(i))
+
+    assert counts['ip'] == {'1m': 61, '1h': 61, '24h': 61}
+
+
+def test_live_counters_ignore_request_timestamp():
+    counters = StreamingCounters()
+    counters.record({**login(), 'timestamp': '2099-01-01T00:00:00Z'})
+    counts = counters.record({k: v for k, v in login().items() if k != 'timestamp'})
+
+    assert counts['ip']['1m'] == 2
+
+
+def test_estimates_never_undercount():
+    # Deliberately narrow sketches to force collisions
+    counters = StreamingCounters(
+        expected_events={'1m': 20, '1h': 20, '24h': 20},
+        use_event_time=True
+    )
+    rng = random.Random(42)
+    truth = Counter()
+    for i in range(2000):
+        ip = f'10.0.{rng.randrange(4)}.{rng.randrange(100)}'
+        truth[ip] += 1
+        counters.record(login(i * 0.01, ip=ip))
+
+    for ip, count in truth.items():
+        assert counters.query(login(20, ip=ip))['ip']['1m'] >= count
+
+
+def test_dimensions_are_counted_independently():
+    counters = StreamingCounters(use_event_time=True)
+    for i in range(5):
+        counters.record(login(i, ip='shared', user=f'user{i}', agent='agent'))
+    counts = counters.record(login(6, ip='other', user='shared', agent='agent'))
+
+    assert counts['ip']['1m'] == 1
+    assert counts['user']['1m'] == 1
+    assert counts['userAgent']['1m'] == 6
+
+
+def test_error_bound_tracks_window_volume():
+    counters = StreamingCounters(use_event_time=True)
+    for i in range(100):
+        counters.record(login(i * 0.5, ip=f'10.0.0.{i}'))
+
+    stats = counters.get_stats()
+    one_minute = stats['windows']['1m']
+    assert one_minute['errorBound']['ip'] > 0
+    assert one_minute['errorBound']['ip'] <= stats['maxError']
@@ -17,6 +17,7 @@ router.post('/analyze-password', mlController.analyzePassword);
 // Protected routes (auth required)
 router.post('/detect-anomaly', protect, mlController.detectAnomaly);
 router.get('/stats', protect, mlController.getMLStats);
+router.get('/score-distribution', protect, mlController.getScoreDistribution);
 
 // Admin-only routes
 router.post('/train', protect, mlController.trainModels);